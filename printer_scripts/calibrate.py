@@ -0,0 +1,293 @@
+import serial
+import sys
+import argparse
+import json
+import re
+from pathlib import Path
+from statistics import median
+from .controller import PrinterController, extract_float, SERIAL_PORT, BAUD_RATE, TIMEOUT, MAX_PENDING
+
+# Constants
+COARSE_STEP = 0.2
+FINE_STEP = 0.01
+FINE_PROBE_MARGIN = 0.05 # Later fine runs start this far above the first run's result; keep it above the probe's repeatability
+SAFE_Z_HEIGHT = 7.0
+DEFAULT_BED_TARGET_TEMP = 65
+DEFAULT_DIMENSIONS = [235, 235, 235] # If your printer does not report geometry with M115, set these instead
+PROBE_DEPLOY_CMD = "M280 P0 S10"
+PROBE_STOW_CMD = "M280 P0 S160"
+PROBE_STOW_DELAY = 2.190
+G38_COARSE_FEEDRATE = 60
+G38_FINE_FEEDRATE = 30
+CACHE_PATH = Path.home() / ".cache" / "printer_scripts" / "m115.json" # Printer geometry/offsets from previous runs
+
+# Response parsers, matched against raw bytes so hot loops don't decode and split every reply
+_PROBE_RE = re.compile(rb'z_probe:\s*(\w+)')
+_M115_AREA_RE = re.compile(rb'max:\{x:([\d.]+),y:([\d.]+)(?:,z:([\d.]+))?\}')
+_M851_RE = re.compile(rb'M851.*?X(-?[\d.]+).*?Y(-?[\d.]+).*?Z(-?[\d.]+)')
+_FIRMWARE_RE = re.compile(rb'FIRMWARE_NAME:(.*?)(?: SOURCE_CODE_URL:|$)', re.MULTILINE)
+
+class Calibrator:
+    def __init__(self, printer, use_g38=False):
+        self.printer = printer
+        self.use_g38 = use_g38 # Marlin doesn't report G38 support, so it has to be asked for
+        self.z_height = SAFE_Z_HEIGHT
+        self.trigger_height = 0.0
+        self.probe_offsets = {"X": 0.0, "Y": 0.0, "Z": 0.0}
+        self.bed_width = None
+        self.bed_height = None
+        self.geometry_reported = False # Whether the bed size came from M115 rather than --dimensions
+        self.firmware = None
+
+    def load_printer_information(self):
+        """Restore M115/M851 results cached by a previous run. Returns False if there is nothing cached."""
+        try:
+            info = json.loads(CACHE_PATH.read_text()).get(self.printer.device_signature())
+        except (OSError, ValueError):
+            return False
+        if not info:
+            return False
+        self.firmware = info["firmware"]
+        self.bed_width = info["bed_width"]
+        self.bed_height = info["bed_height"]
+        self.geometry_reported = self.bed_width is not None
+        self.probe_offsets = info["probe_offsets"]
+        self.printer.log(f"Using cached printer information for {self.firmware} (pass --refresh-printer-info after reflashing)")
+        return True
+
+    def save_printer_information(self):
+        """Write the current printer information through to the cache. Fallback bed dimensions are left out so later --dimensions still apply."""
+        try:
+            cache = json.loads(CACHE_PATH.read_text())
+        except (OSError, ValueError):
+            cache = {}
+        cache[self.printer.device_signature()] = {
+            "firmware": self.firmware,
+            "bed_width": self.bed_width if self.geometry_reported else None,
+            "bed_height": self.bed_height if self.geometry_reported else None,
+            "probe_offsets": self.probe_offsets,
+        }
+        try:
+            CACHE_PATH.parent.mkdir(parents=True, exist_ok=True)
+            CACHE_PATH.write_text(json.dumps(cache, indent=2))
+        except OSError as e:
+            self.printer.log(f"Could not write printer information cache: {e}")
+
+    def get_printer_information(self, dimensions=DEFAULT_DIMENSIONS, use_cache=True):
+        if not (use_cache and self.load_printer_information()):
+            self.query_printer_information()
+        if not self.geometry_reported:
+            self.bed_width = dimensions[0]
+            self.bed_height = dimensions[1]
+
+    def query_printer_information(self):
+        """Ask the printer for M115/M851 and cache the results."""
+        self.printer.send_command("M115")
+        response = self.printer.last_response
+        match = _FIRMWARE_RE.search(response)
+        self.firmware = match.group(1).decode(errors='replace').strip() if match else None
+        match = _M115_AREA_RE.search(response)
+        self.geometry_reported = match is not None
+        if match:
+            self.bed_width, self.bed_height = float(match.group(1)), float(match.group(2))
+        self.printer.send_command("M851")
+        match = _M851_RE.search(self.printer.last_response)
+        if match:
+            self.probe_offsets = {"X": float(match.group(1)), "Y": float(match.group(2)), "Z": float(match.group(3))}
+        self.save_printer_information()
+
+    def get_probe_status(self):
+        self.printer.send_command("M119")
+        match = _PROBE_RE.search(self.printer.last_response)
+        if match is None:
+            return None
+        status = match.group(1).decode().lower()
+        self.printer.log(status)
+        return status
+
+    def probe_triggered(self):
+        return self.get_probe_status() == "triggered"
+    
+    def calculate_center_position(self):
+        """Calculates the center position of the bed considering probe offsets."""
+        center_x = (self.bed_width / 2) - self.probe_offsets["X"]
+        center_y = (self.bed_height / 2) - self.probe_offsets["Y"]
+        return center_x, center_y
+
+    def probe_toward_bed(self, feedrate):
+        """Let the firmware move down until the probe triggers (G38.2), then read back where it stopped."""
+        self.printer.send_command("G90")
+        self.printer.send_command(f"G38.2 Z0 F{feedrate}", timeout=60)
+        self.printer.send_command("M114")
+        self.z_height = extract_float(self.printer.last_response, b"Z:")
+        return self.z_height > 0
+
+    def step_toward_bed(self):
+        """Step down by COARSE_STEP, checking the probe between steps. Used unless G38.2 probing was asked for."""
+        printer = self.printer
+        printer.send_command("G91")
+        # Stream steps and probe checks ahead of their acknowledgements so the
+        # printer's command buffer doesn't sit idle waiting on each round trip.
+        # Each step is followed by M400 so its M119 reads the probe after the move, not during it
+        triggered = False
+        overshoot_steps = 0
+        planned_z_height = self.z_height
+        printer.queue_command("M119")
+        while printer.pending_commands:
+            while not triggered and planned_z_height > 0 and len(printer.pending_commands) + 3 <= MAX_PENDING:
+                printer.queue_command(f"G0 Z-{COARSE_STEP}")
+                printer.queue_command("M400")
+                printer.queue_command("M119")
+                planned_z_height -= COARSE_STEP
+            line, command = printer.read_response()
+            match = _PROBE_RE.match(line)
+            if match and match.group(1).lower() == b"triggered":
+                triggered = True
+            elif command is not None and command.startswith("G0"):
+                self.z_height -= COARSE_STEP
+                printer.log(self.z_height)
+                if triggered:
+                    overshoot_steps += 1
+        if overshoot_steps:
+            # Steps already in flight when the probe triggered; back off to where it fired
+            printer.send_command(f"G0 Z{COARSE_STEP * overshoot_steps}")
+            self.z_height += COARSE_STEP * overshoot_steps
+        return triggered
+
+    def coarse_probe(self):
+        self.printer.message("Coarse range check...")
+        self.printer.send_command(PROBE_DEPLOY_CMD)
+        if self.use_g38:
+            triggered = self.probe_toward_bed(G38_COARSE_FEEDRATE)
+        else:
+            triggered = self.step_toward_bed()
+        if triggered:
+            self.printer.message("Probe triggered!")
+            self.printer.send_command("M114")
+            self.trigger_height = extract_float(self.printer.last_response, b"Z:")
+            self.printer.send_command(PROBE_STOW_CMD)
+            self.printer.sleep(PROBE_STOW_DELAY)
+        self.printer.message(f"Z height: {self.z_height}")
+
+    def fine_probe(self):
+        z_heights = []
+        full_height = self.trigger_height + COARSE_STEP
+        start_height = full_height
+        while len(z_heights) < 3:
+            self.printer.message(f"Fine range check (run {len(z_heights) + 1}/3)...")
+            self.z_height = start_height
+            self.printer.send_command("G90")
+            self.printer.send_command(f"G0 F500 Z{SAFE_Z_HEIGHT}")
+            self.printer.sleep(3)
+            self.printer.send_command(PROBE_DEPLOY_CMD)
+            self.printer.send_command(f"G0 Z{self.z_height}")
+            if self.use_g38:
+                self.probe_toward_bed(G38_FINE_FEEDRATE)
+            else:
+                self.printer.send_command("G91")
+                # send_batch appends M400, so each probe check sees the finished move
+                while not self.probe_triggered() and self.z_height > 0:
+                    self.printer.send_batch([f"G1 Z-{FINE_STEP} F50"])
+                    self.z_height -= FINE_STEP
+            self.printer.message(f"Z height: {self.z_height}")
+            self.printer.send_command(PROBE_STOW_CMD)
+            self.printer.sleep(PROBE_STOW_DELAY)            
+            if start_height < full_height and self.z_height >= start_height:
+                # Triggered before the first step, so the margin was too small; redo this run from the top
+                start_height = full_height
+                continue
+            z_heights.append(self.z_height)
+            if len(z_heights) == 1:
+                # A latching probe stays triggered until redeployed, so rather than backing up and
+                # narrowing in, later runs save steps by starting just above the first result
+                start_height = min(self.z_height + FINE_PROBE_MARGIN, full_height)
+        final_z_height = median(z_heights) # A single snagged run shouldn't drag the result
+        return final_z_height
+
+    def run(self, bed_temp_target, disable_bed, run_g29, skip_homing, dimensions=DEFAULT_DIMENSIONS, use_cache=True):
+        printer = self.printer
+        printer.handle_interrupts()
+        try:
+            printer.message("Calibrating Z-offset...")
+            printer.send_command("M155 S2") # Have the printer report temperatures on its own instead of being polled
+
+            self.get_printer_information(dimensions, use_cache)
+
+            center_x, center_y = self.calculate_center_position()
+            printer.log(f"Center: {center_x}, {center_y}")
+
+            preamble = ["M420 S0 Z0"]
+            if not skip_homing:
+                preamble.append("G28")
+            printer.send_batch(preamble)
+
+            printer.message("Heating bed...")
+            printer.send_command(f"M190 S{bed_temp_target}", timeout=600) # Returns once the bed is at temperature
+
+            printer.send_batch(["G90", f"G0 F500 Z{SAFE_Z_HEIGHT}", f"G0 F5000 X{center_x} Y{center_y}"])
+
+            with printer.buffered_output():
+                self.coarse_probe()
+
+            printer.send_batch(["G90", f"G0 F500 Z{SAFE_Z_HEIGHT}"])
+
+            with printer.buffered_output():
+                final_z_height = self.fine_probe()
+            printer.send_command(f"M851 Z-{final_z_height}")
+            self.probe_offsets["Z"] = -final_z_height
+            self.save_printer_information()
+
+            if disable_bed:
+                printer.send_command("M140 S0")
+                printer.sleep(1)
+
+            if run_g29:
+                printer.send_command("G29 P1", timeout=600) # This is usually around how long it takes for a full repopulate
+                for r in range(2): # For two axes (X, Y)
+                    printer.send_command("G29 P3")
+                    printer.log((["X", "Y"][r]))
+                    printer.sleep(1)
+
+            printer.sleep(1)
+            printer.send_command("M500")
+
+            printer.sleep(3)
+            printer.message(f"Z-offset Set to: -{final_z_height}")
+            printer.sleep(3)
+
+        except KeyboardInterrupt:
+            print("Calibration cancelled")
+        except serial.SerialException as e:
+            print(f"Serial communication error: {e}")
+        except Exception as e:
+            print(f"Error occurred: {e}")
+        finally:
+            printer.cancelled.clear() # Let the cleanup below through after a Ctrl-C; another one still stops it
+            try:
+                printer.send_command("M155 S0") # Otherwise the printer keeps reporting temperatures until it is reset
+            except (serial.SerialException, OSError, KeyboardInterrupt) as e:
+                print(f"Could not turn off temperature reports: {e!r}")
+            printer.close()
+            sys.exit()
+
+def main():
+    parser = argparse.ArgumentParser(description='Z-Probe calibration')
+    parser.add_argument('--port', default=SERIAL_PORT, help='Serial port the printer is connected to')
+    parser.add_argument('--bed-temp', type=int, default=DEFAULT_BED_TARGET_TEMP, help='Target bed temperature in Celsius')
+    parser.add_argument('--disable-bed', action='store_true', help='Disable bed heating after calibration')
+    parser.add_argument('--run-g29', action='store_true', help='Run G29 P1 to repopulate build surface mesh data')
+    parser.add_argument('--skip-homing', action='store_true', help='Skip homing (G28) before calibration')
+    parser.add_argument('--dimensions', type=float, nargs=3, default=DEFAULT_DIMENSIONS, metavar=('X', 'Y', 'Z'), help='Bed size to use if the printer does not report it with M115')
+    parser.add_argument('--g38', action='store_true', help='Probe with G38.2 instead of stepping down (needs G38_PROBE_TARGET enabled in Marlin)')
+    parser.add_argument('--refresh-printer-info', action='store_true', help='Query M115/M851 again instead of using the cached results')
+    args = parser.parse_args()
+
+    try:
+        printer = PrinterController(args.port, BAUD_RATE, TIMEOUT)
+    except serial.SerialException as e:
+        print(f"Serial communication error: {e}")
+        sys.exit()
+    Calibrator(printer, args.g38).run(args.bed_temp, args.disable_bed, args.run_g29, args.skip_homing, args.dimensions, not args.refresh_printer_info)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,286 @@
+import serial
+import time
+import sys
+import os
+import select
+import signal
+import threading
+import array
+import re
+from collections import deque
+from contextlib import contextmanager
+from serial.tools import list_ports
+
+# Constants
+SERIAL_PORT = '/dev/ttyACM0'  # Change to your actual serial port
+BAUD_RATE = 115200
+TIMEOUT = 5
+BOOT_TIMEOUT = 10 # Boards that reset when the port opens (DTR auto-reset) need a while before they listen
+MAX_PENDING = 6 # Commands allowed in flight at once; two step/M400/M119 units, anything past BUFSIZE waits in Marlin's RX buffer
+RESEND_HISTORY = 16 # Sent lines kept around in case the printer asks for them again
+TIOCGSERIAL = 0x541E
+TIOCSSERIAL = 0x541F
+ASYNC_LOW_LATENCY = 0x2000
+
+_RESEND_RE = re.compile(rb'Resend:\s*N?(\d+)')
+
+def extract_float(buf, key):
+    """Parse the number following key (e.g. b'Z:') in a raw reply, without decoding or splitting it. Raises ValueError if key is absent."""
+    i = buf.find(key)
+    if i < 0:
+        raise ValueError(f"No {key.decode()} in reply: {buf.decode(errors='replace')!r}")
+    i += len(key)
+    while i < len(buf) and buf[i] == 0x20:
+        i += 1
+    j = i
+    while j < len(buf) and buf[j] in b'-0123456789.':
+        j += 1
+    return float(buf[i:j])
+
+class PrinterController:
+    def __init__(self, port, baud_rate, timeout):
+        # No software/hardware flow control; pyserial already puts the tty in raw (non-canonical, no echo) mode
+        self.ser = serial.Serial(port, baud_rate, timeout=timeout, xonxoff=False, rtscts=False, dsrdtr=False)
+        self._fd = self.ser.fileno() # pyserial only opens and configures the port; reads and writes go straight to the fd
+        self.pending_commands = deque()
+        self.last_response = b''
+        self._rx_buf = bytearray()
+        self._log = []
+        self._buffer_log = False
+        self._lineno = 0
+        self._sent_lines = deque(maxlen=RESEND_HISTORY)
+        self._last_resend = None
+        self._stale_resends = 0
+        self._skip_oks = 0
+        self.cancelled = threading.Event()
+        self._wakeup_r, self._wakeup_w = os.pipe()
+        os.set_blocking(self._wakeup_w, False)
+        self._old_wakeup_fd = None
+        self._old_sigint = None
+        self.set_low_latency()
+        try:
+            self.reset_line_numbers()
+        except Exception:
+            self.close()
+            raise
+
+    def close(self):
+        if self._old_sigint is not None:
+            # Put back whatever handle_interrupts replaced before its pipe goes away
+            signal.set_wakeup_fd(self._old_wakeup_fd)
+            signal.signal(signal.SIGINT, self._old_sigint)
+            self._old_sigint = None
+        self.ser.close()
+        os.close(self._wakeup_r)
+        os.close(self._wakeup_w)
+
+    def handle_interrupts(self):
+        """Turn Ctrl-C into a cancellation that the next sleep or read acts on, so a write is never cut off halfway."""
+        self._old_wakeup_fd = signal.set_wakeup_fd(self._wakeup_w) # Wakes up select() in _read_lines
+        self._old_sigint = signal.signal(signal.SIGINT, lambda *_: self.cancelled.set())
+
+    def sleep(self, seconds):
+        """Wait for the given time, returning early with KeyboardInterrupt if cancelled."""
+        if self.cancelled.wait(seconds):
+            raise KeyboardInterrupt
+
+    def set_low_latency(self):
+        """Disable the USB-serial latency timer so replies aren't held back ~16 ms (Linux only)."""
+        try:
+            import fcntl
+            serial_info = array.array('i', [0] * 32)
+            fcntl.ioctl(self.ser.fileno(), TIOCGSERIAL, serial_info)
+            serial_info[4] |= ASYNC_LOW_LATENCY  # serial_struct.flags
+            fcntl.ioctl(self.ser.fileno(), TIOCSSERIAL, serial_info)
+        except (ImportError, OSError) as e:
+            self.log(f"Could not enable low latency mode: {e}")
+
+    def device_signature(self):
+        """Identify the attached printer by port and USB IDs, for keying cached information."""
+        for port in list_ports.comports():
+            if port.device == self.ser.port:
+                return f"{port.device}:{port.vid}:{port.pid}:{port.serial_number}"
+        return self.ser.port
+
+    def log(self, text):
+        """Print text, or hold on to it while output is being buffered."""
+        self._log.append(text)
+        if not self._buffer_log:
+            self.flush_log()
+
+    def flush_log(self):
+        if self._log:
+            sys.stdout.write("\n".join(map(str, self._log)) + "\n")
+            sys.stdout.flush()
+            self._log.clear()
+
+    @contextmanager
+    def buffered_output(self):
+        """Hold log output until the end of the block so tight probe loops don't stall on the terminal."""
+        self._buffer_log = True
+        try:
+            yield
+        finally:
+            self._buffer_log = False
+            self.flush_log()
+
+    def message(self, msg):
+        self.send_command(f"M117 {msg}")
+
+    def reset_line_numbers(self):
+        """Restart line numbering so the printer expects N1 next.
+
+        A board that resets when the port opens drops whatever arrives while it boots, so M110 is sent again once Marlin prints its start banner.
+        """
+        deadline = time.monotonic() + BOOT_TIMEOUT
+        while True:
+            self._lineno = -1
+            self._sent_lines.clear() # Old numbers mean nothing once the printer restarts its count
+            self._last_resend = None
+            self._write(["M110 N0"])
+            self.log("\nM110 N0:")
+            for line in self._read_lines(deadline):
+                self.log(f"\t{line.decode(errors='replace')}")
+                if line.startswith(b"ok"):
+                    return
+                if line == b"start":
+                    break
+            else:
+                raise serial.SerialTimeoutException("No response to M110 N0")
+
+    def _write_raw(self, data):
+        """Write all of data to the port, waiting for room if the (non-blocking) fd fills up."""
+        data = memoryview(data)
+        while data:
+            try:
+                data = data[os.write(self._fd, data):]
+            except BlockingIOError:
+                readable, writable, _ = select.select([self._wakeup_r], [self._fd], [], TIMEOUT)
+                if self.cancelled.is_set():
+                    raise KeyboardInterrupt
+                if readable:
+                    os.read(self._wakeup_r, 512) # Some other signal; nothing to do
+                elif not writable:
+                    raise serial.SerialTimeoutException("Printer stopped accepting data")
+
+    def _write(self, commands):
+        """Send commands in a single write, each framed with a line number and checksum."""
+        framed = []
+        for command in commands:
+            self._lineno += 1
+            line = f"N{self._lineno} {command}"
+            checksum = 0
+            for c in line:
+                checksum ^= ord(c)
+            framed_line = f"{line}*{checksum}\n".encode()
+            self._sent_lines.append((self._lineno, framed_line))
+            framed.append(framed_line)
+        self._write_raw(b''.join(framed))
+
+    def _resend(self, lineno):
+        """Retransmit everything from lineno onwards after the printer rejected a line."""
+        if lineno == self._last_resend and self._stale_resends:
+            # Lines that were already in flight get rejected too; the last retransmit covered them
+            self._stale_resends -= 1
+            return
+        self._last_resend = lineno
+        if lineno > self._lineno and self._sent_lines:
+            # The M110 that restarted numbering was rejected, so the printer is still counting from before it
+            lineno = self._sent_lines[0][0]
+        if not self._sent_lines or self._sent_lines[0][0] > lineno:
+            raise serial.SerialException(f"Printer requested line {lineno}, which is no longer buffered")
+        self._stale_resends = self._lineno - lineno
+        self._write_raw(b''.join(framed_line for n, framed_line in self._sent_lines if n >= lineno))
+
+    def _read_lines(self, deadline):
+        """Yield complete lines from the printer until the deadline, keeping any partial line buffered."""
+        while True:
+            newline = self._rx_buf.find(b'\n')
+            if newline >= 0:
+                line = bytes(self._rx_buf[:newline]).strip()
+                del self._rx_buf[:newline + 1]
+                if line.startswith(b"ok"):
+                    if self._skip_oks:
+                        self._skip_oks -= 1  # Acknowledges a resend request, not one of our commands
+                        continue
+                    self._last_resend = None
+                match = _RESEND_RE.match(line)
+                if match:
+                    self._skip_oks += 1
+                    self._resend(int(match.group(1)))
+                if line.startswith(b"T:"):
+                    # Unsolicited M155/M190 report; keep it out of whatever reply we're collecting
+                    self.log(f"\t{line.decode(errors='replace')}")
+                    continue
+                yield line
+            elif time.monotonic() >= deadline:
+                return
+            else:
+                ready, _, _ = select.select([self._fd, self._wakeup_r], [], [], max(0, deadline - time.monotonic()))
+                if self.cancelled.is_set():
+                    raise KeyboardInterrupt
+                if self._wakeup_r in ready:
+                    os.read(self._wakeup_r, 512) # Some other signal; nothing to do
+                if self._fd in ready:
+                    chunk = os.read(self._fd, 4096)
+                    if not chunk:
+                        raise serial.SerialException("Printer disconnected")
+                    self._rx_buf += chunk
+
+    def send_command(self, command, timeout=5):
+        """Send command to the printer and wait for the response.
+
+        Raises SerialTimeoutException if it isn't acknowledged in time, since a late ok would otherwise be taken as the next command's.
+        """
+        self._write([command])
+        lines = []
+        self.log(f"\n{command}:")
+        for line in self._read_lines(time.monotonic() + timeout):
+            lines.append(line)
+            self.log(f"\t{line.decode(errors='replace')}")
+            if line.startswith(b"ok"):
+                break
+        else:
+            raise serial.SerialTimeoutException(f"No response to {command}")
+        self.last_response = b'\n'.join(lines)
+        return self.last_response.decode(errors='replace')
+
+    def send_batch(self, commands, final_sync=True, timeout=60):
+        """Send several commands in a single write and wait until all of them are acknowledged.
+
+        With final_sync an M400 is appended, so this only returns once the queued moves have finished.
+        Raises SerialTimeoutException if they aren't all acknowledged in time.
+        """
+        if final_sync:
+            commands = list(commands) + ["M400"]
+        self._write(commands)
+        lines = []
+        remaining = len(commands)
+        self.log(f"\n{'; '.join(commands)}:")
+        for line in self._read_lines(time.monotonic() + timeout):
+            lines.append(line)
+            self.log(f"\t{line.decode(errors='replace')}")
+            if line.startswith(b"ok"):
+                remaining -= 1
+                if not remaining:
+                    break
+        else:
+            raise serial.SerialTimeoutException(f"No response to {commands[-remaining]}")
+        self.last_response = b'\n'.join(lines)
+        return self.last_response.decode(errors='replace')
+
+    def queue_command(self, command):
+        """Send command to the printer without waiting for its response."""
+        self._write([command])
+        self.pending_commands.append(command)
+        self.log(f"\n{command}:")
+
+    def read_response(self):
+        """Read the next raw response line, retiring the oldest pending command when it is acknowledged."""
+        line = next(self._read_lines(time.monotonic() + TIMEOUT), None)
+        if line is None:
+            raise serial.SerialTimeoutException("Printer stopped responding")
+        self.log(f"\t{line.decode(errors='replace')}")
+        if line.startswith(b"ok") and self.pending_commands:
+            return line, self.pending_commands.popleft()
+        return line, None
@@ -0,0 +1,34 @@
+import serial
+import sys
+import argparse
+from .controller import PrinterController, SERIAL_PORT, BAUD_RATE, TIMEOUT
+
+def run(printer):
+    try:
+        while True:
+            command = input("Enter a command (or 'exit' to quit): ")
+            if command.lower() == 'exit':
+                break
+            printer.send_command(command, timeout=600) # Long enough for G28/M190/G29 typed by hand
+    except serial.SerialException as e:
+        print(f"Serial communication error: {e}")
+    except Exception as e:
+        print(f"Error occurred: {e}")
+    finally:
+        printer.close()
+        sys.exit()
+
+def main():
+    parser = argparse.ArgumentParser(description='Send G-code commands to the printer interactively')
+    parser.add_argument('--port', default=SERIAL_PORT, help='Serial port the printer is connected to')
+    args = parser.parse_args()
+
+    try:
+        printer = PrinterController(args.port, BAUD_RATE, TIMEOUT)
+    except serial.SerialException as e:
+        print(f"Serial communication error: {e}")
+        sys.exit()
+    run(printer)
+
+if __name__ == "__main__":
+    main()